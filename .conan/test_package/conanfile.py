@@ -1,5 +1,4 @@
 #!/usr/bin/env python
-import os
 from conans import ConanFile, CMake
 
 class AlloyConanTest(ConanFile):
@@ -19,8 +18,7 @@ class AlloyConanTest(ConanFile):
 
 
     def test(self):
-        os.chdir("bin")
         if str(self.settings.os) in ["Windows", "Linux", "Macos"]:
-            self.run("alloy-test-package")
+            self.run("alloy-test-package", cwd="bin")
         else:
             self.output.warn("Skipping unit test execution due to cross compiling for {}".format(self.settings.os))
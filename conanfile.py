@@ -56,23 +56,36 @@ class AlloyConan(ConanFile):
         self.copy(pattern="licenses", dst="licenses", folder=True, ignore_case=True)
 
 
+    # CMake definitions that are switched ON/OFF by a boolean option
+    _option_definitions = (
+      # Features
+      ("ALLOY_COMPILE_EXTRAS", "extras"),
+      ("ALLOY_COMPILE_EXAMPLES", "examples"),
+      ("ALLOY_GENERATE_DOCS", "install_docs"),
+      ("ALLOY_INSTALL_DOCS", "install_docs"),
+
+      # ABI
+      ("BUILD_SHARED_LIBS", "shared"),
+      ("ALLOY_ENABLE_EXCEPTIONS", "exceptions"),
+    )
+
+    _cmake = None
+
     def configure_cmake(self):
+        # Configure only once; build() and package() share the same CMake
+        if self._cmake is not None:
+            return self._cmake
+
         cmake = CMake(self)
 
-        # Features
         cmake.definitions["ALLOY_COMPILE_SELF_CONTAINMENT_TESTS"] = "ON"
         cmake.definitions["ALLOY_COMPILE_TESTS"] = "OFF"
-        cmake.definitions["ALLOY_COMPILE_EXTRAS"] = "ON" if self.options.extras else "OFF"
-        cmake.definitions["ALLOY_COMPILE_EXAMPLES"] = "ON" if self.options.examples else "OFF"
-        cmake.definitions["ALLOY_GENERATE_DOCS"] = "ON" if self.options.install_docs else "OFF"
-        cmake.definitions["ALLOY_INSTALL_DOCS"] = "ON" if self.options.install_docs else "OFF"
-
-        # ABI
-        cmake.definitions["BUILD_SHARED_LIBS"] = "ON" if self.options.shared else "OFF"
-        cmake.definitions["ALLOY_ENABLE_EXCEPTIONS"] = "ON" if self.options.exceptions else "OFF"
+        for definition, option in self._option_definitions:
+            cmake.definitions[definition] = "ON" if getattr(self.options, option) else "OFF"
         cmake.definitions["ALLOY_PRECISION"] = self.options.precision
 
         cmake.configure()
+        self._cmake = cmake
         return cmake
 
 
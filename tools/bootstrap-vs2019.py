@@ -3,24 +3,25 @@
 Script for bootstrapping cmake for VS 2019
 """
 
-def tool_path():
-  import os
-  import pathlib
-
-  path = os.path.realpath(__file__) # ./tools/bootstrap-*.py
-  path = os.path.dirname(path)      # ./tools/
+import os
+import pathlib
+import runpy
+import sys
 
-  return pathlib.Path(path)
+def tool_path():
+  # Only resolve symlinks when the script is one; abspath is purely lexical
+  if os.path.islink(__file__):
+    return pathlib.Path(os.path.realpath(__file__)).parent # ./tools/
+  return pathlib.Path(os.path.abspath(__file__)).parent   # ./tools/
 
 if __name__ == "__main__":
 
-  import subprocess
-  import sys
-
-  command = [
-    "python3", tool_path() / "bootstrap.py",
+  # Run bootstrap.py in this interpreter rather than spawning a second one
+  script = str(tool_path() / "bootstrap.py")
+  sys.argv = [
+    script,
     *sys.argv[1:],
     "--generator", "Visual Studio 16 2019"
   ]
 
-  subprocess.run(command)
+  runpy.run_path(script, run_name="__main__")
@@ -4,7 +4,26 @@ Script for bootstrapping cmake
 """
 
 import argparse
+import os
+import subprocess
+import sys
 from pathlib import Path
+
+# Only resolve symlinks when the script is one; abspath is purely lexical
+ROOT_PATH = Path(os.path.realpath(__file__) if os.path.islink(__file__)
+                 else os.path.abspath(__file__)).parent.parent # ./
+
+# Build files that cmake rewrites at the end of every successful configure.
+# A failed configure still updates CMakeCache.txt but never reaches these.
+# The Visual Studio and Xcode generators only rewrite their projects when
+# they change, so those build directories are always reconfigured
+GENERATED_BUILD_FILES = ["build.ninja", "Makefile"]
+
+# Definitions that cmake rewrites in the cache (the compiler becomes a full
+# path), so they never compare equal. The compiler is already part of the
+# build directory name, so a different compiler never reuses this cache
+UNCOMPARED_DEFINES = {"CMAKE_CXX_COMPILER"}
+
 argument_parser = argparse.ArgumentParser()
 argument_parser.add_argument(
   "--tests",
@@ -51,37 +70,69 @@ argument_parser.add_argument(
   action="store"
 )
 
-def root_path():
-  import os
-
-  path = os.path.realpath(__file__) # ./tools/bootstrap.py
-  path = os.path.dirname(path)      # ./tools/
-  path = os.path.dirname(path)      # ./
-
-  return Path(path)
-
 def create_directory(build_path : Path):
   # Make the build directory
-  import os
-  os.makedirs(build_directory, exist_ok=True)
+  os.makedirs(build_path, exist_ok=True)
 
 def install_dependencies(build_path : Path):
   # Install Conan
-  import subprocess
-
   command=['conan', 'install', '..']
 
   subprocess.run(command, cwd=build_path)
 
+def read_cmake_cache(build_path : Path):
+  # Read the 'KEY:TYPE=VALUE' entries of an existing CMakeCache.txt
+  cache = {}
+  cache_path = build_path / "CMakeCache.txt"
+  if not cache_path.exists():
+    return cache
+
+  with open(cache_path) as cache_file:
+    for line in cache_file:
+      if line.startswith(("//", "#")) or "=" not in line:
+        continue
+      entry, _, value = line.rstrip("\n").partition("=")
+      key, _, _ = entry.partition(":")
+      cache[key] = value
+
+  return cache
+
+def is_generated(build_path : Path):
+  # Check that the last configure got as far as writing the build system
+  cache_time = (build_path / "CMakeCache.txt").stat().st_mtime_ns
+  for name in GENERATED_BUILD_FILES:
+    path = build_path / name
+    if path.exists() and path.stat().st_mtime_ns >= cache_time:
+      return True
+
+  return False
+
+def is_configured(build_path : Path, defines : map, options : map):
+  # Check whether a previous, successful configure used the same defines
+  # and generator
+  cache = read_cmake_cache(build_path)
+  if not cache or not is_generated(build_path):
+    return False
+
+  if any(cache.get(x) != y for x,y in defines.items()
+         if x not in UNCOMPARED_DEFINES):
+    return False
+
+  return cache.get("CMAKE_GENERATOR") == options.get("-G")
+
 def configure_project(build_path : Path, defines : map, options : map):
-  # Configure the project
-  import subprocess
+  # Configure the project, unless nothing changed since the last configure;
+  # cmake regenerates on its own during the build if its inputs are touched
+  if is_configured(build_path, defines, options):
+    return 0
 
-  command = ["cmake",".."]
-  command += [f'-D{x}={y}' for x,y in cmake_defines.items()]
-  command += [f'{x}{y}' for x,y in cmake_options.items()]
+  command = [
+    "cmake", "..",
+    *(f'-D{x}={y}' for x,y in defines.items()),
+    *(f'{x}{y}' for x,y in options.items()),
+  ]
 
-  subprocess.run(command, cwd=build_path)
+  return subprocess.run(command, cwd=build_path).returncode
 
 
 if __name__ == "__main__":
@@ -116,13 +167,13 @@ if __name__ == "__main__":
     build_directory += f"-{compiler}"
   build_directory += f"-{generator}"
   if generator != "xcode" and not generator.startswith("visual") and generator != "ninja multi-config":
-    build_directory+f"-{build_type}"
+    build_directory += f"-{build_type}"
   build_directory = build_directory.lower()
 
-  build_path = root_path() / build_directory
+  build_path = ROOT_PATH / build_directory
 
   # Bootstrap the project
 
   create_directory(build_path)
   install_dependencies(build_path)
-  configure_project(build_path, cmake_defines, cmake_options)
+  sys.exit(configure_project(build_path, cmake_defines, cmake_options))
@@ -0,0 +1,25 @@
+"""
+Helpers for choosing how many processes the tool scripts run in parallel
+"""
+
+import os
+import re
+
+def available_cpus():
+  # Honor the CPU affinity mask (e.g. a container's cpuset) where supported
+  if hasattr(os, "sched_getaffinity"):
+    return len(os.sched_getaffinity(0))
+  return os.cpu_count() or 1
+
+def default_jobs():
+  # Prefer a job count handed down by CI ($CI_JOBS) or by an enclosing
+  # 'make -jN' ($MAKEFLAGS) over the number of usable CPUs
+  ci_jobs = os.environ.get("CI_JOBS", "")
+  if ci_jobs.isdigit() and int(ci_jobs) > 0:
+    return int(ci_jobs)
+
+  match = re.search(r"(?:^|\s)-j\s*(\d+)", os.environ.get("MAKEFLAGS", ""))
+  if match and int(match.group(1)) > 0:
+    return int(match.group(1))
+
+  return available_cpus()
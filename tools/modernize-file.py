@@ -4,7 +4,19 @@ Script for bootstrapping cmake
 """
 
 import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
 from pathlib import Path
+
+from jobs import default_jobs
+
+# Only resolve symlinks when the script is one; abspath is purely lexical
+ROOT_PATH = Path(os.path.realpath(__file__) if os.path.islink(__file__)
+                 else os.path.abspath(__file__)).parent.parent # ./
+
 argument_parser = argparse.ArgumentParser()
 argument_parser.add_argument(
   "--db",
@@ -12,34 +24,75 @@ argument_parser.add_argument(
   type=Path,
   action="store"
 )
+argument_parser.add_argument(
+  "--jobs",
+  help="The number of clang-tidy processes to run in parallel",
+  type=int,
+  action="store",
+  default=default_jobs()
+)
 
-def root_path():
-  import os
+def compiled_files(db_path : Path):
+  # Collect the source files listed in the compilation database
+  db_file_path = db_path / "compile_commands.json"
+  if not db_file_path.exists():
+    return set()
 
-  path = os.path.realpath(__file__) # ./tools/bootstrap.py
-  path = os.path.dirname(path)      # ./tools/
-  path = os.path.dirname(path)      # ./
+  with open(db_file_path) as db_file:
+    return {
+      os.path.normpath(os.path.join(x["directory"], x["file"]))
+      for x in json.load(db_file)
+    }
 
-  return Path(path)
+def can_run_parallel(db_path : Path, files : list):
+  # run-clang-tidy only processes files from the compilation database, so
+  # headers and other uncompiled files still need a plain clang-tidy run
+  if db_path is None or len(files) < 2 or not shutil.which("run-clang-tidy"):
+    return False
 
-if __name__ == "__main__":
+  compiled = compiled_files(db_path)
+  return all(f in compiled for f in files)
 
-  ROOT_PATH = root_path()
+if __name__ == "__main__":
 
   # Handle argument parsing
   args, files = argument_parser.parse_known_args()
-  db_path = args.db
+  db_path = args.db.resolve() if args.db else None
+
+  # clang-tidy runs from the repository root, so anchor the inputs to the
+  # current directory (lexically, without touching the filesystem) and drop
+  # duplicates so no file is fixed twice
+  files = list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+  # Nothing to modernize; don't pay for starting clang-tidy
+  if not files:
+    argument_parser.exit(message="No files to modernize\n")
+
+  checks = "-*,modernize-use-trailing-return-type"
 
-  command = [
-    "clang-tidy",
-    "--format-style=file",
-    "--checks=-*,modernize-use-trailing-return-type",
-    "--fix",
-    f"-p={db_path}",
-  ]
-  command.extend(files)
+  if can_run_parallel(db_path, files):
+    # Files are searched for as regular expressions in the database entries,
+    # so anchor each one to match only its own entry
+    command = [
+      "run-clang-tidy",
+      f"-j={args.jobs}",
+      f"-checks={checks}",
+      "-fix",
+      "-format",
+      "-style=file",
+      f"-p={db_path}",
+    ]
+    command.extend(f"^{re.escape(f)}$" for f in files)
+  else:
+    command = [
+      "clang-tidy",
+      "--format-style=file",
+      f"--checks={checks}",
+      "--fix",
+      f"-p={db_path}",
+    ]
+    command.extend(files)
 
   print(command)
 
-  import subprocess
   subprocess.run(command, cwd=ROOT_PATH)
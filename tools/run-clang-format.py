@@ -3,33 +3,208 @@
 Script for running clang-format locally
 """
 
-def root_path():
-  import os
+import argparse
+import fnmatch
+import os
+import re
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from pathlib import Path
 
-  path = os.path.realpath(__file__) # ./tools/run-clang-format.py
-  path = os.path.dirname(path)      # ./tools/
-  path = os.path.dirname(path)      # ./
+from jobs import default_jobs
 
-  return path
+# Only resolve symlinks when the script is one; abspath is purely lexical
+ROOT_PATH = Path(os.path.realpath(__file__) if os.path.islink(__file__)
+                 else os.path.abspath(__file__)).parent.parent # ./
 
+# Resolved once so that each batch doesn't search PATH again
+CLANG_FORMAT = shutil.which("clang-format") or "clang-format"
 
-if __name__ == "__main__":
+STYLE_PATH = ROOT_PATH / ".clang-format"
+
+# Below this many files a single clang-format process is faster than paying
+# for several process start-ups
+PARALLEL_THRESHOLD = 200
+
+# Upper bound on files per clang-format process, keeping each command line
+# well below ARG_MAX and the 32K character limit on Windows
+MAX_BATCH_SIZE = 250
+
+SOURCE_DIRECTORIES = ["lib", "bin", "extra", "example"]
+SOURCE_EXTENSIONS = {".hpp", ".inl", ".cpp"}
+
+# Build output and vendored code that may live inside a source location
+EXCLUDED_DIRECTORIES = {".git", "build", "_deps", "third_party", "external"}
+EXCLUDED_PREFIXES = ("cmake-build",)
+
+# Generated sources, which are rewritten by their generator anyway
+EXCLUDED_FILE_PATTERNS = ["*.pb.*", "*.generated.*"]
+
+argument_parser = argparse.ArgumentParser()
+argument_parser.add_argument(
+  "--changed-only",
+  help="Only format sources changed since the merge-base with --base",
+  action="store_true",
+  default=False
+)
+argument_parser.add_argument(
+  "--base",
+  help="The branch that --changed-only compares against",
+  type=str,
+  action="store",
+  default="origin/master"
+)
+
+def is_excluded_directory(name : str):
+  return name in EXCLUDED_DIRECTORIES or name.startswith(EXCLUDED_PREFIXES)
+
+def is_source(path : str):
+  if os.path.splitext(path)[1] not in SOURCE_EXTENSIONS:
+    return False
+
+  # git lists paths rather than walking, so check every directory on the way
+  directory, name = os.path.split(path)
+  if any(is_excluded_directory(x) for x in Path(directory).parts):
+    return False
 
-  import glob
-  import subprocess
+  return not any(fnmatch.fnmatch(name, x) for x in EXCLUDED_FILE_PATTERNS)
 
-  ROOT_PATH = root_path()
+def git_output(*args):
+  # Run a git command from the root, exiting with git's error if it fails
+  result = subprocess.run(["git", *args],
+                          cwd=ROOT_PATH,
+                          capture_output=True,
+                          text=True)
+  if result.returncode != 0:
+    sys.exit(result.stderr.strip())
 
+  return result.stdout
+
+def find_changed_sources(base : str):
+  # List the sources that were added, copied, modified or renamed since the
+  # merge-base with 'base', including changes not yet committed and new
+  # files that git doesn't track yet
+  merge_base = git_output("merge-base", base, "HEAD").strip()
+  changes = git_output("diff", "--name-only", "-z", "--diff-filter=ACMR",
+                       merge_base, "--", *SOURCE_DIRECTORIES)
+  untracked = git_output("ls-files", "-z", "--others", "--exclude-standard",
+                         "--", *SOURCE_DIRECTORIES)
+
+  return [x for x in (changes + untracked).split("\0") if is_source(x)]
+
+def find_git_sources():
+  # List the sources that are tracked by git or are new and not ignored. This
+  # leaves out ignored build output. Returns None when the sources aren't in
+  # a git checkout or git isn't available
+  command = ["git", "ls-files", "-z", "--cached", "--others",
+             "--exclude-standard", "--", *SOURCE_DIRECTORIES]
+  try:
+    result = subprocess.run(command,
+                            cwd=ROOT_PATH,
+                            capture_output=True,
+                            text=True)
+  except OSError:
+    return None
+
+  if result.returncode != 0:
+    return None
+
+  # --cached still lists tracked files that were deleted but not yet staged
+  return [x for x in result.stdout.split("\0")
+          if is_source(x) and os.path.exists(ROOT_PATH / x)]
+
+def walk_sources():
+  # Collect the sources of every location in a single walk per location,
+  # relative to the root that clang-format runs from
   files = []
-  # Glob all files in all source locations
-  for subpath in ["lib", "bin", "extra", "example"]:
-    for extension in ["hpp", "inl", "cpp"]:
-      glob_expression = "{}/**/*.{}".format(subpath,extension)
-      files.extend(glob.glob(glob_expression,recursive=True))
+  for subpath in SOURCE_DIRECTORIES:
+    for root, dirs, names in os.walk(ROOT_PATH / subpath):
+      # Prune in place so the walk never descends into excluded directories
+      dirs[:] = [x for x in dirs if not is_excluded_directory(x)]
+
+      relative_root = os.path.relpath(root, ROOT_PATH)
+      files.extend(os.path.join(relative_root, x) for x in names
+                   if is_source(x))
+
+  return files
+
+def find_sources():
+  files = find_git_sources()
+  if files is None:
+    files = walk_sources()
+
+  return files
+
+def style_argument():
+  # clang-format 14 and later accept an explicit style file, which spares
+  # them from searching upwards from every input for a .clang-format
+  try:
+    result = subprocess.run([CLANG_FORMAT, "--version"],
+                            capture_output=True,
+                            text=True)
+  except OSError:
+    return "-style=file"
+
+  match = re.search(r"version (\d+)\.", result.stdout)
+  if match and int(match.group(1)) >= 14:
+    return f"--style=file:{STYLE_PATH}"
+
+  return "-style=file"
+
+def format_command(style : str, files : list):
+  command = [CLANG_FORMAT, style]
+  command.extend(files)
+
+  return command
+
+def format_files(style : str, files : list):
+  # Format a batch of files, capturing the output so that batches running
+  # concurrently don't interleave on stdout
+  return subprocess.run(format_command(style, files),
+                        cwd=ROOT_PATH,
+                        stdout=subprocess.PIPE)
+
+
+if __name__ == "__main__":
+
+  args = argument_parser.parse_args()
+
+  if args.changed_only:
+    files = find_changed_sources(args.base)
+  else:
+    files = find_sources()
+
+  # clang-format reads from stdin when given no files, so skip it entirely
+  if not files:
+    sys.exit(0)
 
   # TODO(bitwizeshift):
   #   Make clang-format run in-place once the formatting guideline is stable
-  command = ["clang-format","-style=file"]
-  command.extend(files)
+  style = style_argument()
+  jobs = default_jobs()
+  single_batch = jobs < 2 or len(files) < PARALLEL_THRESHOLD
+  if single_batch and len(files) <= MAX_BATCH_SIZE:
+    command = format_command(style, files)
+
+    # Nothing is left to do afterwards, so let clang-format replace this
+    # process. Windows has no real exec, so wait on a child process there
+    if os.name == "posix":
+      os.chdir(ROOT_PATH)
+      os.execvp(command[0], command)
+
+    sys.exit(subprocess.run(command, cwd=ROOT_PATH).returncode)
+
+  # Split the files evenly between one clang-format process per job
+  batch_size = min((len(files) + jobs - 1) // jobs, MAX_BATCH_SIZE)
+  batches = [files[i:i+batch_size] for i in range(0, len(files), batch_size)]
+
+  returncode = 0
+  with ThreadPoolExecutor(max_workers=jobs) as executor:
+    for result in executor.map(format_files, repeat(style), batches):
+      sys.stdout.buffer.write(result.stdout)
+      returncode = returncode or result.returncode
 
-  subprocess.run(command, cwd=ROOT_PATH)
+  sys.exit(returncode)
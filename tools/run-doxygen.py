@@ -3,23 +3,131 @@
 Script for generating doxygen output
 """
 
-def root_path():
-  import os
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
 
-  path = os.path.realpath(__file__) # ./tools/run-doxygen.py
-  path = os.path.dirname(path)      # ./tools/
-  path = os.path.dirname(path)      # ./
+# Only resolve symlinks when the script is one; abspath is purely lexical
+ROOT_PATH = Path(os.path.realpath(__file__) if os.path.islink(__file__)
+                 else os.path.abspath(__file__)).parent.parent # ./
 
-  return path
+# Doxyfile tags naming files or directories that doxygen reads
+INPUT_TAGS = [
+  "INPUT",
+  "EXAMPLE_PATH",
+  "IMAGE_PATH",
+  "LAYOUT_FILE",
+  "CITE_BIB_FILES",
+  "PROJECT_LOGO",
+  "HTML_HEADER",
+  "HTML_FOOTER",
+  "HTML_STYLESHEET",
+  "HTML_EXTRA_STYLESHEET",
+  "HTML_EXTRA_FILES",
+]
+
+argument_parser = argparse.ArgumentParser()
+argument_parser.add_argument(
+  "--force",
+  help="Regenerate the documentation even if no input has changed",
+  action="store_true",
+  default=False
+)
+
+def read_doxyfile_lines(doxyfile_path : Path):
+  # Yield the logical lines of a doxyfile, joining lines continued with '\'
+  pending = ""
+  with open(doxyfile_path) as doxyfile:
+    for line in doxyfile:
+      line = line.strip()
+      if line.endswith("\\"):
+        pending += line[:-1] + " "
+        continue
+
+      yield pending + line
+      pending = ""
+
+  if pending:
+    yield pending
+
+def split_doxyfile_value(value : str):
+  # Split a tag value into its words, keeping quoted words with spaces
+  # whole. Doxygen has no escape character, so backslashes in Windows paths
+  # are kept as they are
+  lexer = shlex.shlex(value, posix=True)
+  lexer.whitespace_split = True
+  lexer.commenters = ""
+  lexer.escape = ""
+  return list(lexer)
+
+def read_doxyfile_tags(doxyfile_path : Path):
+  # Read the values of each 'TAG = ...' and 'TAG += ...' line of a doxyfile
+  tags = {}
+  for line in read_doxyfile_lines(doxyfile_path):
+    if line.startswith("#") or "=" not in line:
+      continue
+
+    key, _, value = line.partition("=")
+    if key.endswith("+"):
+      tags.setdefault(key[:-1].strip(), []).extend(split_doxyfile_value(value))
+    else:
+      tags[key.strip()] = split_doxyfile_value(value)
+
+  return tags
+
+def latest_modification(paths : list):
+  # Find the newest modification time of any of the paths or their contents.
+  # Directories are included too, so that removed files are noticed
+  latest = 0
+  for path in paths:
+    if path.is_dir():
+      for root, _, names in os.walk(path):
+        latest = max(latest, os.stat(root).st_mtime_ns)
+        for name in names:
+          latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    elif path.exists():
+      latest = max(latest, path.stat().st_mtime_ns)
+
+  return latest
+
+def is_up_to_date(stamp_path : Path, inputs : list):
+  if not stamp_path.exists():
+    return False
+
+  return stamp_path.stat().st_mtime_ns >= latest_modification(inputs)
 
 
 if __name__ == "__main__":
 
-  import subprocess
-  import os
+  args = argument_parser.parse_args()
 
-  doxyfile_path = os.path.join(root_path(),".codedocs")
+  doxyfile_path = ROOT_PATH / ".codedocs"
+  tags = read_doxyfile_tags(doxyfile_path)
+
+  # The stamp lives with the output, so deleting the output forces a rebuild.
+  # Doxygen writes to the current directory without an OUTPUT_DIRECTORY, so
+  # keep the stamp out of the repository root in that case
+  output_directory = tags.get("OUTPUT_DIRECTORY") or ["build/doc"]
+  stamp_path = ROOT_PATH / output_directory[0] / ".doxygen-stamp"
+  inputs = [doxyfile_path]
+  for tag in INPUT_TAGS:
+    inputs.extend(ROOT_PATH / x for x in tags.get(tag, []))
+
+  if not args.force and is_up_to_date(stamp_path, inputs):
+    print("Documentation is up to date")
+    sys.exit(0)
+
+  # Stamp with the start time so inputs edited during the run aren't missed
+  started = time.time_ns()
 
   subprocess.run(["doxygen", doxyfile_path],
-                  cwd=root_path(),
+                  cwd=ROOT_PATH,
                   check=True)
+
+  stamp_path.parent.mkdir(parents=True, exist_ok=True)
+  stamp_path.touch()
+  os.utime(stamp_path, ns=(started, started))